@@ -16,7 +16,7 @@ echo ""
 # 安装 Python 依赖
 echo "安装 Python 依赖包..."
 pip3 install --upgrade pip
-pip3 install playwright beautifulsoup4 PyPDF2 lxml
+pip3 install playwright beautifulsoup4 "pypdf>=4" lxml aiofiles
 echo "✓ Python 依赖安装完成"
 echo ""
 
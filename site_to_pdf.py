@@ -4,26 +4,178 @@ HTTrack 网站转 PDF 工具 (使用 Playwright)
 将 HTTrack 抓取的网站转换为单个 PDF 文件
 """
 
+import os
+import re
 import sys
 import argparse
+import itertools
 import asyncio
+import base64
+import html
 import tempfile
 import logging
+import queue
+from collections import deque
+from functools import lru_cache
+from logging.handlers import QueueHandler, QueueListener
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from pathlib import Path
+import aiofiles
 from bs4 import BeautifulSoup
-from PyPDF2 import PdfMerger
+from lxml import etree, html as lxml_html
+from pypdf import PdfWriter
 from playwright.async_api import async_playwright
-from typing import List, Dict, Set
+from typing import List, Dict, Set, Optional, Tuple
 from urllib.parse import unquote
 
 # 配置日志
+_LOG_FORMAT = '%(asctime)s - %(levelname)s - %(message)s'
 logging.basicConfig(
     level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s'
+    format=_LOG_FORMAT
 )
 logger = logging.getLogger(__name__)
 
 
+def _start_log_listener() -> QueueListener:
+    """将日志输出移到后台线程，事件循环中只需把日志记录放入队列"""
+    root = logging.getLogger()
+    log_queue = queue.Queue(-1)
+    listener = QueueListener(log_queue, *root.handlers, respect_handler_level=True)
+    root.handlers = [QueueHandler(log_queue)]
+    listener.start()
+    return listener
+
+
+def _init_worker_logging():
+    """子进程中直接输出日志（主进程的日志队列在子进程中没有监听线程）"""
+    handler = logging.StreamHandler()
+    handler.setFormatter(logging.Formatter(_LOG_FORMAT))
+    logging.getLogger().handlers = [handler]
+
+
+# 固定按 UTF-8 解析，跳过 lxml 的字符集嗅探
+_HTML_PARSER = lxml_html.HTMLParser(encoding='utf-8')
+
+
+# 排除项：预编译为单个正则，一次扫描匹配所有模式
+_EXCLUDE_PATTERNS = [
+    'hts-cache', 'hts-log', 
+    'backblue.gif', 'fade.gif',
+    'index.html~',  # 临时文件
+    '/404',  # 404 错误页面
+]
+_EXCLUDE_RE = re.compile('|'.join(re.escape(p) for p in _EXCLUDE_PATTERNS))
+
+# 兜底打印样式：终极推土机策略 - 强制所有内容可见和换行
+_PRINT_CSS_RULES = [
+    "@page { size: A4; margin: 10mm 10mm 12mm 10mm; }",
+    # 全局覆盖 - 强制所有元素可见
+    "* { overflow: visible !important; max-width: none !important; }",
+    "html, body { width: auto !important; overflow: visible !important; }",
+    "body, .theme-container, main, .page, .theme-default-content, div, section { max-width: none !important; width: auto !important; }",
+    "img, svg, video, canvas { max-width: 100% !important; height: auto !important; }",
+    ".theme-container { padding-left: 0 !important; padding-right: 0 !important; }",
+    "main.page, .page, main { margin: 0 !important; padding: 0 8mm !important; }",
+    ".theme-default-content, .content__default { width: 100% !important; padding: 0 !important; }",
+    # 代码块强制换行
+    "pre, pre code, code { white-space: pre-wrap !important; word-break: break-all !important; overflow-wrap: break-word !important; }",
+    # 表格 - 保证内容完整但不过度拆分单词
+    "table { table-layout: auto !important; width: 100% !important; border-collapse: collapse !important; overflow: visible !important; }",
+    "table td, table th { white-space: normal !important; overflow-wrap: break-word !important; overflow: visible !important; padding: 6px !important; font-size: 12px !important; line-height: 1.5 !important; }",
+    "table td code, table th code { white-space: pre-wrap !important; word-break: break-all !important; }",
+    # 避免固定定位元素覆盖内容
+    "[style*='position:fixed'], [style*='position: fixed'] { display: none !important; }",
+    # 避免在关键元素内部分页
+    "tr, pre, code, figure { page-break-inside: avoid !important; }",
+]
+
+# 隐藏侧边栏和导航栏
+_HIDE_SIDEBAR_CSS = ".sidebar, aside.sidebar, .sidebar-mask, .navbar, header.navbar, nav, .page-edit, .page-nav, .search-box, .sidebar-button, .global-ui { display: none !important; }"
+
+
+def _scan_dir(directory: str) -> Tuple[List[str], List[str]]:
+    """列出单个目录，返回 (子目录列表, HTML 文件列表)"""
+    subdirs, files = [], []
+    try:
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    subdirs.append(entry.path)
+                elif entry.name.endswith(('.html', '.htm')) and entry.is_file():
+                    files.append(entry.path)
+    except OSError as e:
+        logger.warning(f"无法读取目录 {directory}: {e}")
+    return subdirs, files
+
+
+def _parse_one(html_file: Path, httrack_dir: Path) -> Optional[Tuple[str, Dict]]:
+    """解析单个 HTML 文件，返回 (页面路径, 页面信息)；出错时返回 None"""
+    try:
+        with open(html_file, 'rb') as f:
+            content = f.read()
+        
+        # 直接用 lxml XPath 取字符串，避免为每个节点创建 BS4 Tag 对象
+        try:
+            tree = lxml_html.fromstring(content, parser=_HTML_PARSER)
+            title_text = tree.xpath('string(//title)').strip() or html_file.stem
+            hrefs = tree.xpath('//a/@href')
+        except etree.ParserError:
+            # 0 字节文件或只含注释、XML 声明的文件没有可解析的元素
+            title_text = html_file.stem
+            hrefs = []
+        
+        # 提取所有内部链接
+        links = []
+        for href in hrefs:
+            # 清理链接
+            href = unquote(href.split('#')[0].split('?')[0])
+            
+            if href and (href.endswith(('.html', '.htm')) or href.endswith('/')):
+                links.append(href)
+        
+        # 提取页面层级（基于路径深度）
+        relative_path = html_file.relative_to(httrack_dir)
+        depth = len(relative_path.parts) - 1
+        
+        return str(html_file), {
+            'title': title_text,
+            'links': list(set(links)),  # 去重
+            'file': html_file,
+            'depth': depth,
+            'relative_path': str(relative_path)
+        }
+        
+    except Exception as e:
+        logger.error(f"解析文件 {html_file} 时出错: {e}")
+        return None
+
+
+@lru_cache(maxsize=None)
+def _resolve_link_cached(httrack_dir: str, current_dir: str, link: str) -> Optional[str]:
+    """解析链接为规范化的绝对路径（纯字符串运算，不访问文件系统）"""
+    # 处理相对链接
+    if not link.startswith(('http://', 'https://')):
+        # 移除前导 ./
+        link = link.lstrip('./')
+        
+        if link.startswith('/'):
+            # 绝对路径（相对于网站根目录）
+            linked_file = Path(httrack_dir) / link.lstrip('/')
+        else:
+            # 相对路径
+            linked_file = Path(current_dir) / link
+        
+        # 处理目录链接
+        if link.endswith('/'):
+            linked_file = linked_file / 'index.html'
+        
+        # 规范化路径：HTTrack 输出中没有符号链接，normpath 即可代替 resolve()
+        return os.path.normpath(str(linked_file))
+    
+    return None
+
+
 class SiteToPDF:
     def __init__(self, 
                  httrack_dir: str, 
@@ -31,7 +183,8 @@ class SiteToPDF:
                  browser_type: str = "chromium",
                  max_pages: int = None,
                  include_toc: bool = True,
-                 hide_sidebar: bool = True):
+                 hide_sidebar: bool = True,
+                 workers: int = 4):
         """
         初始化转换器
         
@@ -42,6 +195,7 @@ class SiteToPDF:
             max_pages: 最大转换页面数
             include_toc: 是否包含目录
             hide_sidebar: 是否隐藏侧边栏和导航栏
+            workers: 并发转换的页面数
         """
         self.httrack_dir = Path(httrack_dir).resolve()
         self.output_pdf = output_pdf
@@ -49,81 +203,66 @@ class SiteToPDF:
         self.max_pages = max_pages
         self.include_toc = include_toc
         self.hide_sidebar = hide_sidebar
+        self.workers = max(1, workers)
+        
+        # 打印样式固定不变，只拼接一次
+        css_rules = list(_PRINT_CSS_RULES)
+        if self.hide_sidebar:
+            css_rules.append(_HIDE_SIDEBAR_CSS)
+        self._css_rules = "\n".join(css_rules)
         
         self.html_files: List[Path] = []
         self.page_info: Dict[str, Dict] = {}
         self.visited_pages: Set[str] = set()
+        self._known_files_set: Set[str] = set()
+        self._cdp_sessions: Dict = {}
         
     def find_html_files(self) -> List[Path]:
         """递归查找所有 HTML 文件"""
         logger.info("正在搜索 HTML 文件...")
         
-        html_patterns = ['*.html', '*.htm']
+        # 单次遍历目录树，按层并发 scandir 以掩盖网络存储的延迟
         html_files = []
+        level = [str(self.httrack_dir)]
         
-        for pattern in html_patterns:
-            html_files.extend(self.httrack_dir.rglob(pattern))
+        with ThreadPoolExecutor(max_workers=16) as executor:
+            while level:
+                next_level = []
+                for subdirs, files in executor.map(_scan_dir, level):
+                    next_level.extend(subdirs)
+                    html_files.extend(Path(f) for f in files)
+                level = next_level
         
         # 过滤排除项
-        exclude_patterns = [
-            'hts-cache', 'hts-log', 
-            'backblue.gif', 'fade.gif',
-            'index.html~',  # 临时文件
-            '/404',  # 404 错误页面
-        ]
-        
         self.html_files = [
             f for f in html_files 
-            if not any(pattern in str(f) for pattern in exclude_patterns)
+            if not _EXCLUDE_RE.search(f.as_posix())
         ]
         
+        self._known_files_set = {str(f) for f in self.html_files}
+        
         logger.info(f"找到 {len(self.html_files)} 个 HTML 文件")
         return self.html_files
     
-    def analyze_page_structure(self):
+    async def analyze_page_structure(self):
         """分析页面结构和链接关系"""
         logger.info("分析页面链接关系...")
         
-        for html_file in self.html_files:
-            try:
-                with open(html_file, 'r', encoding='utf-8', errors='ignore') as f:
-                    content = f.read()
-                    soup = BeautifulSoup(content, 'html.parser')
-                
-                # 提取页面信息
-                title = soup.find('title')
-                title_text = title.get_text().strip() if title else html_file.stem
-                
-                # 提取元数据
-                meta_description = soup.find('meta', attrs={'name': 'description'})
-                description = meta_description.get('content', '') if meta_description else ''
-                
-                # 提取所有内部链接
-                links = []
-                for link in soup.find_all('a', href=True):
-                    href = link['href']
-                    # 清理链接
-                    href = unquote(href.split('#')[0].split('?')[0])
-                    
-                    if href and (href.endswith(('.html', '.htm')) or href.endswith('/')):
-                        links.append(href)
-                
-                # 提取页面层级（基于路径深度）
-                relative_path = html_file.relative_to(self.httrack_dir)
-                depth = len(relative_path.parts) - 1
-                
-                self.page_info[str(html_file)] = {
-                    'title': title_text,
-                    'description': description,
-                    'links': list(set(links)),  # 去重
-                    'file': html_file,
-                    'depth': depth,
-                    'size': html_file.stat().st_size,
-                    'relative_path': str(relative_path)
-                }
-                
-            except Exception as e:
-                logger.error(f"解析文件 {html_file} 时出错: {e}")
+        # 解析是 CPU 密集型任务，使用多进程绕开 GIL；各进程自行读取文件，
+        # 在线程中等待 map 结果，使事件循环可与浏览器启动并行
+        loop = asyncio.get_running_loop()
+        with ProcessPoolExecutor(max_workers=os.cpu_count(),
+                                 initializer=_init_worker_logging) as executor:
+            results = await loop.run_in_executor(None, lambda: list(executor.map(
+                _parse_one, self.html_files,
+                itertools.repeat(self.httrack_dir),
+                chunksize=32
+            )))
+        
+        for result in results:
+            if result:
+                page_path, info = result
+                self.page_info[page_path] = info
     
     def find_start_page(self) -> str:
         """查找网站首页"""
@@ -160,30 +299,31 @@ class SiteToPDF:
         
         return None
     
-    def build_page_tree(self) -> List[str]:
+    async def build_page_tree(self) -> List[str]:
         """构建页面树结构（使用侧边栏顺序或广度优先遍历）"""
         start_page = self.find_start_page()
         if not start_page:
             return [str(f) for f in self.html_files]
         
         # 尝试从首页提取侧边栏链接顺序
-        ordered_pages = self._extract_sidebar_order(start_page)
+        ordered_pages = await self._extract_sidebar_order(start_page)
         
         if ordered_pages:
             logger.info(f"使用侧边栏顺序，找到 {len(ordered_pages)} 个页面")
-            # 添加任何未在侧边栏中的页面
+            # 添加任何未在侧边栏中的页面（dict 保序且成员判断为 O(1)）
+            ordered = dict.fromkeys(ordered_pages)
             for page_path in self.page_info.keys():
-                if page_path not in ordered_pages:
-                    ordered_pages.append(page_path)
+                ordered.setdefault(page_path)
+            ordered_pages = list(ordered)
         else:
             # 回退到广度优先遍历
             logger.info("使用广度优先遍历")
             ordered_pages = []
-            queue = [start_page]
+            pending = deque([start_page])
             self.visited_pages.clear()
             
-            while queue and (not self.max_pages or len(ordered_pages) < self.max_pages):
-                current_page = queue.pop(0)
+            while pending and (not self.max_pages or len(ordered_pages) < self.max_pages):
+                current_page = pending.popleft()
                 
                 if current_page in self.visited_pages:
                     continue
@@ -199,27 +339,31 @@ class SiteToPDF:
                 
                 # 添加链接页面到队列
                 if current_page in self.page_info:
+                    current_dir = str(Path(current_page).parent)
                     for link in self.page_info[current_page]['links']:
-                        linked_page = self._resolve_link(current_page, link)
+                        linked_page = self._resolve_link(current_dir, link)
                         if linked_page and linked_page not in self.visited_pages:
-                            queue.append(linked_page)
+                            pending.append(linked_page)
             
-            # 添加未访问的页面
+            # 添加未访问的页面（visited_pages 与 ordered_pages 内容一致，用集合判断）
             for page_path in self.page_info.keys():
-                if page_path not in ordered_pages:
-                    if not self.max_pages or len(ordered_pages) < self.max_pages:
-                        ordered_pages.append(page_path)
+                if self.max_pages and len(ordered_pages) >= self.max_pages:
+                    break
+                if page_path not in self.visited_pages:
+                    self.visited_pages.add(page_path)
+                    ordered_pages.append(page_path)
         
         logger.info(f"页面树构建完成，共 {len(ordered_pages)} 个页面")
         return ordered_pages
     
-    def _extract_sidebar_order(self, index_page: str) -> List[str]:
+    async def _extract_sidebar_order(self, index_page: str) -> List[str]:
         """从首页侧边栏提取页面顺序"""
         try:
-            with open(index_page, 'r', encoding='utf-8', errors='ignore') as f:
-                soup = BeautifulSoup(f.read(), 'html.parser')
+            async with aiofiles.open(index_page, 'r', encoding='utf-8', errors='ignore') as f:
+                soup = BeautifulSoup(await f.read(), 'lxml')
             
-            ordered_pages = [index_page]  # 首页放在第一位
+            # 首页放在第一位；dict 作为有序集合，成员判断为 O(1)
+            ordered_pages = {index_page: None}
             
             # 查找侧边栏链接
             sidebar = soup.find('aside', class_='sidebar')
@@ -227,50 +371,29 @@ class SiteToPDF:
                 sidebar = soup.find('ul', class_='sidebar-links')
             
             if sidebar:
+                index_dir = str(Path(index_page).parent)
+                
                 # 按顺序提取所有链接
                 for link in sidebar.find_all('a', class_='sidebar-link'):
                     href = link.get('href', '')
                     if href and not href.startswith(('http://', 'https://', '#')):
                         # 解析相对路径
-                        linked_page = self._resolve_link(index_page, href)
-                        if linked_page and linked_page not in ordered_pages:
-                            ordered_pages.append(linked_page)
+                        linked_page = self._resolve_link(index_dir, href)
+                        if linked_page:
+                            ordered_pages.setdefault(linked_page)
                 
-                return ordered_pages
+                return list(ordered_pages)
             
             return []
         except Exception as e:
             logger.warning(f"无法提取侧边栏顺序: {e}")
             return []
     
-    def _resolve_link(self, current_page: str, link: str) -> str:
-        """解析链接为绝对路径"""
-        current_dir = Path(current_page).parent
-        
-        # 处理相对链接
-        if not link.startswith(('http://', 'https://')):
-            # 移除前导 ./
-            link = link.lstrip('./')
-            
-            if link.startswith('/'):
-                # 绝对路径（相对于网站根目录）
-                linked_file = self.httrack_dir / link.lstrip('/')
-            else:
-                # 相对路径
-                linked_file = current_dir / link
-            
-            # 处理目录链接
-            if link.endswith('/'):
-                linked_file = linked_file / 'index.html'
-            
-            # 规范化路径
-            try:
-                linked_file = linked_file.resolve()
-                if linked_file.exists() and linked_file.is_file():
-                    return str(linked_file)
-            except Exception:
-                pass
-        
+    def _resolve_link(self, current_dir: str, link: str) -> Optional[str]:
+        """解析链接为绝对路径（结果按 (目录, 链接) 缓存），只返回已找到的 HTML 文件"""
+        linked_file = _resolve_link_cached(str(self.httrack_dir), current_dir, link)
+        if linked_file in self._known_files_set:
+            return linked_file
         return None
     
     def _resolve_page_path(self, page_path: str) -> str:
@@ -283,24 +406,32 @@ class SiteToPDF:
         
         return None
     
-    async def html_to_pdf(self, page, html_file: str, pdf_file: str) -> bool:
-        """使用 Playwright 将 HTML 转换为 PDF - 完全模拟浏览器打印"""
+    async def _new_print_page(self, browser):
+        """创建一个已配置好视口和打印介质的页面，供多次转换复用"""
+        # 提前设置更宽视口，减少布局换行导致的截断
+        context = await browser.new_context(viewport={"width": 2048, "height": 1400})
+        page = await context.new_page()
+
+        # 模拟打印介质（让浏览器采用 print 媒体规则）
         try:
-            # 提前设置更宽视口，减少布局换行导致的截断
-            try:
-                await page.set_viewport_size({"width": 2048, "height": 1400})
-            except Exception:
-                pass
+            await page.emulate_media(media="print")
+        except Exception:
+            pass
 
-            # 模拟打印介质（让浏览器采用 print 媒体规则）
-            try:
-                await page.emulate_media(media="print")
-            except Exception:
-                pass
+        # Chromium 下直接使用 CDP 导出 PDF，绕过 page.pdf() 的整块传输
+        if self.browser_type == "chromium":
+            self._cdp_sessions[page] = await context.new_cdp_session(page)
 
-            # 加载本地文件并等待网络空闲
-            file_url = Path(html_file).as_uri()
-            await page.goto(file_url, wait_until='networkidle', timeout=60000)
+        return page
+    
+    async def html_to_pdf(self, page, html_file: str, pdf_file: str,
+                          file_url: Optional[str] = None) -> bool:
+        """使用 Playwright 将 HTML 转换为 PDF - 完全模拟浏览器打印（页面需由 _new_print_page 创建）"""
+        try:
+            # 加载本地文件：file:// 没有真实网络请求，等待 load（图片、样式已就绪）即可，
+            # 无需 networkidle 额外的 500ms 静默期
+            file_url = file_url or Path(html_file).as_uri()
+            await page.goto(file_url, wait_until='load', timeout=30000)
 
             # 等主要内容渲染
             try:
@@ -308,53 +439,91 @@ class SiteToPDF:
             except Exception:
                 pass
 
-            # 兜底打印样式：终极推土机策略 - 强制所有内容可见和换行
-            css_rules = [
-                "@page { size: A4; margin: 10mm 10mm 12mm 10mm; }",
-                # 全局覆盖 - 强制所有元素可见
-                "* { overflow: visible !important; max-width: none !important; }",
-                "html, body { width: auto !important; overflow: visible !important; }",
-                "body, .theme-container, main, .page, .theme-default-content, div, section { max-width: none !important; width: auto !important; }",
-                "img, svg, video, canvas { max-width: 100% !important; height: auto !important; }",
-                ".theme-container { padding-left: 0 !important; padding-right: 0 !important; }",
-                "main.page, .page, main { margin: 0 !important; padding: 0 8mm !important; }",
-                ".theme-default-content, .content__default { width: 100% !important; padding: 0 !important; }",
-                # 代码块强制换行
-                "pre, pre code, code { white-space: pre-wrap !important; word-break: break-all !important; overflow-wrap: break-word !important; }",
-                # 表格 - 保证内容完整但不过度拆分单词
-                "table { table-layout: auto !important; width: 100% !important; border-collapse: collapse !important; overflow: visible !important; }",
-                "table td, table th { white-space: normal !important; overflow-wrap: break-word !important; overflow: visible !important; padding: 6px !important; font-size: 12px !important; line-height: 1.5 !important; }",
-                "table td code, table th code { white-space: pre-wrap !important; word-break: break-all !important; }",
-                # 避免固定定位元素覆盖内容
-                "[style*='position:fixed'], [style*='position: fixed'] { display: none !important; }",
-                # 避免在关键元素内部分页
-                "tr, pre, code, figure { page-break-inside: avoid !important; }",
-            ]
+            # 注入兜底打印样式
+            await page.add_style_tag(content=self._css_rules)
 
-            if self.hide_sidebar:
-                css_rules.append(".sidebar, aside.sidebar, .sidebar-mask, .navbar, header.navbar, nav, .page-edit, .page-nav, .search-box, .sidebar-button, .global-ui { display: none !important; }")
-
-            await page.add_style_tag(content="\n".join(css_rules))
-
-            # 等样式应用
-            await asyncio.sleep(0.5)
+            # 等待两帧，确保样式应用后的布局已完成
+            await page.evaluate("() => new Promise(r => requestAnimationFrame(() => requestAnimationFrame(r)))")
 
             # 导出为 A4，保留背景；更小的缩放以容纳更多内容
-            await page.pdf(
-                path=pdf_file,
-                print_background=True,
-                prefer_css_page_size=True, # 优先使用 @page
-                scale=0.85
-            )
+            cdp = self._cdp_sessions.get(page)
+            if cdp:
+                await self._print_pdf_via_cdp(cdp, pdf_file)
+            else:
+                await page.pdf(
+                    path=pdf_file,
+                    print_background=True,
+                    prefer_css_page_size=True, # 优先使用 @page
+                    scale=0.85
+                )
             return True
         except Exception as e:
             logger.error(f"转换 {Path(html_file).name} 时出错: {e}")
             return False
     
+    async def _print_pdf_via_cdp(self, cdp, pdf_file: str):
+        """通过 CDP Page.printToPDF 以流方式导出 PDF，边读边写入磁盘"""
+        result = await cdp.send('Page.printToPDF', {
+            'printBackground': True,
+            'preferCSSPageSize': True,  # 优先使用 @page
+            'scale': 0.85,
+            # 与 page.pdf() 默认值一致，页边距由 @page 控制
+            'marginTop': 0, 'marginBottom': 0, 'marginLeft': 0, 'marginRight': 0,
+            'transferMode': 'ReturnAsStream',
+        })
+        handle = result['stream']
+        try:
+            async with aiofiles.open(pdf_file, 'wb') as f:
+                while True:
+                    chunk = await cdp.send('IO.read', {'handle': handle, 'size': 65536})
+                    data = chunk.get('data', '')
+                    if chunk.get('base64Encoded'):
+                        await f.write(base64.b64decode(data))
+                    else:
+                        await f.write(data.encode('utf-8'))
+                    if chunk.get('eof'):
+                        break
+        finally:
+            await cdp.send('IO.close', {'handle': handle})
+    
+    async def _convert_toc(self, page_pool: asyncio.Queue, page_order: List[str],
+                           temp_dir: str) -> Optional[str]:
+        """生成并转换目录页，成功时返回 PDF 路径"""
+        logger.info("生成目录页...")
+        toc_html = self.generate_toc_html(page_order)
+        toc_file = Path(temp_dir) / "toc.html"
+        toc_file.write_text(toc_html, encoding='utf-8')
+        
+        toc_pdf = str(Path(temp_dir) / "000_toc.pdf")
+        page = await page_pool.get()
+        try:
+            if await self.html_to_pdf(page, str(toc_file), toc_pdf):
+                return toc_pdf
+            return None
+        finally:
+            page_pool.put_nowait(page)
+    
+    async def _convert_one(self, page_pool: asyncio.Queue, page_path: str, file_url: str,
+                           pdf_file: str, index: int, total: int) -> Optional[str]:
+        """从页面池取出空闲页面转换单个文件，成功时返回 PDF 路径"""
+        page = await page_pool.get()
+        try:
+            page_name = Path(page_path).name
+            logger.info("[%d/%d] 转换: %s", index, total, page_name)
+            
+            if await self.html_to_pdf(page, page_path, pdf_file, file_url):
+                return pdf_file
+            
+            logger.warning("跳过页面: %s", page_name)
+            return None
+        finally:
+            page_pool.put_nowait(page)
+    
     def generate_toc_html(self, page_order: List[str]) -> str:
         """生成目录页面（带层级结构）"""
         total_pages = len(page_order)
-        toc_html = f"""<!DOCTYPE html>
+        # 用列表收集片段后一次性拼接，避免循环中 += 反复复制整个字符串
+        parts = [f"""<!DOCTYPE html>
 <html>
 <head>
     <meta charset="UTF-8">
@@ -430,7 +599,7 @@ class SiteToPDF:
     <h1>📚 网站目录</h1>
     <p>共 <strong>{total_pages}</strong> 个页面</p>
     <hr>
-"""
+"""]
         
         for i, page_path in enumerate(page_order, 1):
             info = self.page_info.get(page_path, {})
@@ -444,18 +613,30 @@ class SiteToPDF:
             # 生成层级指示符
             indent_symbol = "└─ " if depth > 0 else ""
             
-            toc_html += f"""    <div class="toc-item depth-{display_depth}">
+            parts.append(f"""    <div class="toc-item depth-{display_depth}">
         <span class="page-number">{i}.</span>
         <span class="depth-indicator">{indent_symbol}</span>
-        <span class="page-title">{title}</span>
-        <div class="page-path">{relative_path}</div>
+        <span class="page-title">{html.escape(title)}</span>
+        <div class="page-path">{html.escape(relative_path)}</div>
     </div>
-"""
+""")
         
-        toc_html += """</body>
+        parts.append("""</body>
 </html>
-"""
-        return toc_html
+""")
+        return "".join(parts)
+    
+    async def _launch_browser(self, p):
+        """启动指定类型的浏览器，不支持的类型返回 None"""
+        if self.browser_type == "chromium":
+            return await p.chromium.launch(headless=True)
+        elif self.browser_type == "firefox":
+            return await p.firefox.launch(headless=True)
+        elif self.browser_type == "webkit":
+            return await p.webkit.launch(headless=True)
+        
+        logger.error(f"不支持的浏览器类型: {self.browser_type}")
+        return None
     
     async def convert(self):
         """执行完整的转换流程"""
@@ -466,83 +647,87 @@ class SiteToPDF:
             logger.error("未找到 HTML 文件")
             return False
         
-        # 2. 分析页面结构
-        self.analyze_page_structure()
-        
-        # 3. 构建页面树
-        page_order = self.build_page_tree()
-        
-        if not page_order:
-            logger.error("没有可转换的页面")
-            return False
-        
-        logger.info(f"准备转换 {len(page_order)} 个页面")
-        
-        # 4. 使用 Playwright 转换
         async with async_playwright() as p:
-            # 启动浏览器
+            # 启动浏览器，与页面分析并行进行
             logger.info(f"启动 {self.browser_type} 浏览器...")
+            launch_task = asyncio.create_task(self._launch_browser(p))
             
-            if self.browser_type == "chromium":
-                browser = await p.chromium.launch(headless=True)
-            elif self.browser_type == "firefox":
-                browser = await p.firefox.launch(headless=True)
-            elif self.browser_type == "webkit":
-                browser = await p.webkit.launch(headless=True)
-            else:
-                logger.error(f"不支持的浏览器类型: {self.browser_type}")
+            # 2. 分析页面结构
+            await self.analyze_page_structure()
+            
+            # 3. 构建页面树
+            page_order = await self.build_page_tree()
+            
+            browser = await launch_task
+            if not browser:
                 return False
             
-            page = await browser.new_page()
+            if not page_order:
+                logger.error("没有可转换的页面")
+                await browser.close()
+                return False
+            
+            logger.info(f"准备转换 {len(page_order)} 个页面")
+            
+            # 4. 使用 Playwright 转换：每个并发任务独占一个上下文中的页面
+            page_pool = asyncio.Queue()
+            for _ in range(self.workers):
+                page_pool.put_nowait(await self._new_print_page(browser))
             
             # 5. 创建临时目录
             with tempfile.TemporaryDirectory() as temp_dir:
-                pdf_files = []
+                pdf_tasks = []
                 
                 # 生成目录页
                 if self.include_toc:
-                    logger.info("生成目录页...")
-                    toc_html = self.generate_toc_html(page_order)
-                    toc_file = Path(temp_dir) / "toc.html"
-                    toc_file.write_text(toc_html, encoding='utf-8')
-                    
-                    toc_pdf = Path(temp_dir) / "000_toc.pdf"
-                    if await self.html_to_pdf(page, str(toc_file), str(toc_pdf)):
-                        pdf_files.append(str(toc_pdf))
+                    pdf_tasks.append(asyncio.create_task(
+                        self._convert_toc(page_pool, page_order, temp_dir)
+                    ))
                 
-                # 6. 逐个转换页面
-                for i, page_path in enumerate(page_order, 1):
-                    page_name = Path(page_path).name
-                    logger.info(f"[{i}/{len(page_order)}] 转换: {page_name}")
-                    
-                    pdf_file = Path(temp_dir) / f"page_{i:04d}.pdf"
-                    
-                    if await self.html_to_pdf(page, page_path, str(pdf_file)):
-                        pdf_files.append(str(pdf_file))
-                    else:
-                        logger.warning(f"跳过页面: {page_name}")
+                # 6. 并发转换页面
+                file_urls = [path.as_uri() for path in map(Path, page_order)]
+                pdf_tasks.extend(
+                    asyncio.create_task(self._convert_one(
+                        page_pool, page_path, file_url,
+                        str(Path(temp_dir) / f"page_{i:04d}.pdf"),
+                        i, len(page_order)
+                    ))
+                    for i, (page_path, file_url) in enumerate(zip(page_order, file_urls), 1)
+                )
                 
-                await browser.close()
+                # 7. 合并 PDF：按原顺序等待每个页面，转换完成即追加，与后续页面的转换并行
+                try:
+                    success = await self.merge_pdfs(pdf_tasks)
+                finally:
+                    # 合并失败时不再继续转换剩余页面
+                    for task in pdf_tasks:
+                        task.cancel()
+                    await asyncio.gather(*pdf_tasks, return_exceptions=True)
+                    await browser.close()
                 
-                # 7. 合并 PDF
-                if pdf_files:
-                    logger.info(f"合并 {len(pdf_files)} 个 PDF 文件...")
-                    return self.merge_pdfs(pdf_files)
-                else:
-                    logger.error("没有成功转换的 PDF 文件")
-                    return False
+                return success
     
-    def merge_pdfs(self, pdf_files: List[str]) -> bool:
-        """合并多个 PDF 文件"""
+    async def merge_pdfs(self, pdf_tasks: List[asyncio.Task]) -> bool:
+        """按顺序等待各页面的转换结果，边转换边合并为一个 PDF 文件"""
+        loop = asyncio.get_running_loop()
         try:
-            merger = PdfMerger()
+            writer = PdfWriter()
+            merged = 0
             
-            for pdf_file in pdf_files:
-                if Path(pdf_file).exists():
-                    merger.append(pdf_file)
+            for task in pdf_tasks:
+                pdf_file = await task
+                if pdf_file and Path(pdf_file).exists():
+                    # 合并是 CPU 密集型操作，放到线程中执行以免阻塞页面转换
+                    await loop.run_in_executor(None, writer.append, pdf_file)
+                    merged += 1
             
-            merger.write(self.output_pdf)
-            merger.close()
+            if not merged:
+                logger.error("没有成功转换的 PDF 文件")
+                return False
+            
+            logger.info(f"已合并 {merged} 个 PDF 文件，正在写入...")
+            await loop.run_in_executor(None, writer.write, self.output_pdf)
+            writer.close()
             
             logger.info(f"✅ PDF 已保存至: {self.output_pdf}")
             
@@ -583,6 +768,8 @@ async def main():
                        help='不生成目录页')
     parser.add_argument('--keep-sidebar', action='store_true',
                        help='保留侧边栏和导航栏（默认隐藏）')
+    parser.add_argument('-j', '--workers', type=int, default=4,
+                       help='并发转换的页面数 (默认: 4)')
     
     args = parser.parse_args()
     
@@ -596,16 +783,22 @@ async def main():
         browser_type=args.browser,
         max_pages=args.max_pages,
         include_toc=not args.no_toc,
-        hide_sidebar=not args.keep_sidebar
+        hide_sidebar=not args.keep_sidebar,
+        workers=args.workers
     )
     
-    success = await converter.convert()
-    
-    if success:
-        logger.info("转换完成!")
-    else:
-        logger.error("转换失败!")
-        sys.exit(1)
+    log_listener = _start_log_listener()
+    try:
+        success = await converter.convert()
+        
+        if success:
+            logger.info("转换完成!")
+        else:
+            logger.error("转换失败!")
+            sys.exit(1)
+    finally:
+        # 退出前输出队列中剩余的日志
+        log_listener.stop()
 
 
 if __name__ == "__main__":